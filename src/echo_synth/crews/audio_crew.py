@@ -1,3 +1,6 @@
+from functools import lru_cache
+from typing import List
+
 from crewai import (Agent, Crew, Process, Task, LLM)
 from crewai.project import CrewBase, agent, crew, task
 
@@ -7,6 +10,21 @@ from echo_synth.tools import (
     DallEImageGenerationTool
 )
 
+
+@lru_cache(maxsize=None)
+def get_shared_tools():
+    """
+    Create the crew's tools once per process.
+
+    Every AudioProcessingCrew (one per processed audio file) shares these
+    tools and their OpenAI clients. The crews themselves are not shared,
+    because their tasks hold per-run outputs. The analysis tool transcribes
+    through the same WhisperTranscriptionTool the transcriber agent uses.
+    """
+    whisper_tool = WhisperTranscriptionTool()
+    return whisper_tool, DallEImageGenerationTool(), AudioAnalysisTool(whisper_tool=whisper_tool)
+
+
 # If you want to run a snippet of code before or after the crew starts,
 # you can use the @before_kickoff and @after_kickoff decorators
 # https://docs.crewai.com/concepts/crews#example-crew-class-with-decorators
@@ -30,10 +48,8 @@ class AudioProcessingCrew():
         
     def setup_tools(self):
         """Set up tools for the agents"""
-        # Initialize our custom tools with the API key
-        self.whisper_tool = WhisperTranscriptionTool()
-        self.dalle_tool = DallEImageGenerationTool()
-        self.audio_analysis_tool = AudioAnalysisTool()
+        # Reuse the process-wide tools initialized with the API key
+        self.whisper_tool, self.dalle_tool, self.audio_analysis_tool = get_shared_tools()
 
 
     @agent
@@ -128,3 +144,33 @@ class AudioProcessingCrew():
             verbose=True,
             # process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
         )
+
+    def transcription_crew(self) -> Crew:
+        """Creates the crew that transcribes the audio, which every branch needs first"""
+        return self._branch_crew(self.convert_audio_to_text())
+
+    def branch_crews(self) -> List[Crew]:
+        """
+        Creates one crew per independent branch of work on the transcription
+
+        The branches have no dependencies on each other, so they can run
+        concurrently: image generation only waits on its own image summary.
+        Their tasks read the transcription through their context, so the
+        transcription crew must have finished first.
+        """
+        return [
+            self._branch_crew(self.write_speech()),
+            self._branch_crew(self.write_summary()),
+            self._branch_crew(self.write_image_summary(), self.create_image()),
+        ]
+
+    def _branch_crew(self, *tasks: Task) -> Crew:
+        # Tasks and agents are memoized by CrewBase, so every branch shares
+        # the task objects (and outputs) the context lists refer to
+        agents = list({id(t.agent): t.agent for t in tasks}.values())
+        return Crew(
+            agents=agents,
+            tasks=list(tasks),
+            process=Process.sequential,
+            verbose=True,
+        )
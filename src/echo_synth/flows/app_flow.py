@@ -1,141 +1,259 @@
 import os
+import asyncio
 import traceback
-from typing import List
+from typing import Optional
 from pydantic import BaseModel
 
 from crewai.flow.flow import Flow, listen, start
 from crewai.tasks import TaskOutput
 
-from echo_synth.crews import AudioProcessingCrew, JsonSavingCrew
+# The crews and tools (crewai_tools, tool schemas, caches) are imported inside
+# the methods that run them, so building the flow graph (e.g. for plot())
+# stays cheap
+
+
+# Maps each audio crew task to the state field it fills and its display label
+TASK_RESULTS = {
+    "convert_audio_to_text": ("transcribed_text", "TRANSCRIPTION"),
+    "write_speech": ("speech_text", "SPEECH OUTPUT"),
+    "write_summary": ("summary_text", "SUMMARY OUTPUT"),
+    "write_image_summary": ("summary_for_image", "IMAGE SUMMARY OUTPUT"),
+    "create_image": ("image_file", "IMAGE OUTPUT"),
+}
+
+
+# Directory the run results are saved to, one JSON file per flow ID
+OUTPUT_DIR = "output"
 
 
 class EchoSynthState(BaseModel):
-    
+
     transcribed_text: str = ""
     image_file: str = ""
     speech_text: str = ""
     summary_text: str = ""
     summary_for_image: str = ""
-    
+
     json_file_path: str = ""
 
 
 class EchoSynthFlow(Flow[EchoSynthState]):
 
-    def __init__(self, audio_file_path=None):
-        """Initialize the flow with optional parameters"""
+    def __init__(self, audio_file_path=None, reformat_json=False):
+        """
+        Initialize the flow with optional parameters
+
+        Args:
+            audio_file_path: Path to the audio file to process
+            reformat_json: Let the JsonSavingCrew organize the saved JSON
+                instead of writing the state as is
+        """
         super().__init__()
         self.audio_file_path = audio_file_path
-    
+        self.reformat_json = reformat_json
+        self._json_checkpoint: Optional[asyncio.Task] = None
+
     @start()
-    def process_audio(self) -> None:
+    async def process_audio(self) -> None:
         """
         Process an audio file using the AudioProcessingCrew.
-        
-        Args:
-            state: The current state of the flow
-            audio_file_path: Path to the audio file to process
-            openai_api_key: OpenAI API key for Whisper and DALL-E
-            
-        Returns:
-            Updated state with transcription, speech, summary and image
+
+        The transcription runs first, then the speech, summary and
+        image summary -> image branches run as concurrent crews, so the run
+        takes as long as the transcription plus the slowest branch.
+
+        Task outputs are streamed back from the crews as each task finishes,
+        so the state is filled and shown incrementally. A JSON checkpoint of
+        the partial state is started as soon as the transcription is ready
+        and runs while the remaining tasks (including DALL-E) are in flight.
+        The checkpoint is skipped when reformat_json is set, so the
+        JsonSavingCrew only runs once, on the complete state.
         """
+        from echo_synth.crews import AudioProcessingCrew
+
         try:
             print("=== STARTING PROCESS_AUDIO ===")
-            
-            audio_crew = AudioProcessingCrew().crew()
-            
+
+            audio_crew = AudioProcessingCrew()
+
+            # Task callbacks fire on the crews' worker threads, so hand the
+            # outputs over to the event loop through a queue
+            loop = asyncio.get_running_loop()
+            task_outputs: asyncio.Queue = asyncio.Queue()
+
             # Set up context for the first task
             initial_context = {
                 "audio_file_path": os.path.abspath(self.audio_file_path)
             }
-                        
-            # Run the crew with the initial context
-            results = audio_crew.kickoff(inputs=initial_context).tasks_output
-            
-            # Extract task outputs by task ID
-            self.state.transcribed_text = self._get_task_output_by_name(results, "convert_audio_to_text")
-            self.state.speech_text = self._get_task_output_by_name(results, "write_speech")
-            self.state.summary_text = self._get_task_output_by_name(results, "write_summary")
-            self.state.summary_for_image = self._get_task_output_by_name(results, "write_image_summary")
-            self.state.image_file = self._get_task_output_by_name(results, "create_image")
-            
+
+            async def run_crew(crew) -> None:
+                crew.task_callback = lambda output: loop.call_soon_threadsafe(
+                    task_outputs.put_nowait, output
+                )
+                await crew.kickoff_async(inputs=initial_context)
+
+            async def run_crews() -> None:
+                await run_crew(audio_crew.transcription_crew())
+                await asyncio.gather(*(run_crew(crew) for crew in audio_crew.branch_crews()))
+
+            # Run the crews in the background with the initial context and
+            # push a sentinel once they are done (successfully or not)
+            crew_run = asyncio.create_task(run_crews())
+            crew_run.add_done_callback(lambda _: task_outputs.put_nowait(None))
+
+            while (task_output := await task_outputs.get()) is not None:
+                self._record_task_output(task_output)
+
+                if task_output.name == "convert_audio_to_text" and not self.reformat_json:
+                    self._json_checkpoint = asyncio.create_task(
+                        self._save_state_to_json(self._dump_state())
+                    )
+
+            # Surface any error raised by the crews
+            await crew_run
+
             print("=== AUDIO PROCESSING COMPLETE ===")
-            
+
         except Exception as e:
             print(f"Error in process_audio: {e}")
             print(traceback.format_exc())
+
+            # Let a checkpoint that is still being written finish, and
+            # collect its result so its own errors are not left unretrieved
+            if self._json_checkpoint is not None:
+                await asyncio.gather(self._json_checkpoint, return_exceptions=True)
             raise
 
 
     @listen(process_audio)
-    def save_output(self) -> None:
+    async def save_output(self) -> None:
         """
-        Save the state data to a JSON file using the JsonSavingCrew
+        Save the state data to a JSON file
         """
         try:
             print("=== STARTING JSON SAVING ===")
-            
-            json_crew = JsonSavingCrew().crew()
-            
-            # Convert state to dictionary for the crew and add the flow ID
-            state_dict = self.state.model_dump()
-            state_dict["id"] = self.state.id
-            
-            # Run the crew with the state data
-            results = json_crew.kickoff(
-                inputs={
-                    "state_data": state_dict,
-                    "file_id": self.state.id
-                }
-            ).tasks_output
-            
-            # Get the json file path from the results
-            self.state.json_file_path = self._get_task_output_by_name(results, "save_to_json")
-            
+
+            # Let the partial checkpoint land first so the full record is
+            # saved after it
+            if self._json_checkpoint is not None:
+                await self._json_checkpoint
+
+            self.state.json_file_path = await self._save_state_to_json(self._dump_state())
+
             print("=== JSON SAVING COMPLETE ===")
-            
+
         except Exception as e:
             print(f"Error in save_output: {e}")
             print(traceback.format_exc())
             raise
-    
+
 
     @listen(save_output)
-    def show_results(self) -> None:
-        # Print summary of results
+    async def show_results(self) -> None:
+        from echo_synth.tools.audio_tools import ANALYSIS_CACHE, WHISPER_CACHE
+        from echo_synth.tools.image_tools import DALLE_CACHE
+
+        # Task outputs are shown as they complete; finish with the run summary
         print("\n=== RESULTS ===\n")
 
         print(f"AUDIO FILE: {self.audio_file_path}")
         print("\n=========================================\n")
-        print(f"TRANSCRIPTION: {self.state.transcribed_text}")
-        print("\n=========================================\n")
-        print(f"SPEECH OUTPUT: {self.state.speech_text}")
-        print("\n=========================================\n")
-        print(f"SUMMARY OUTPUT: {self.state.summary_text}")
-        print("\n=========================================\n")
-        print(f"IMAGE SUMMARY OUTPUT: {self.state.summary_for_image}")
+        print(f"JSON OUTPUT: {self.state.json_file_path}")
         print("\n=========================================\n")
-        print(f"IMAGE OUTPUT: {self.state.image_file}")
+        print(f"WHISPER CACHE: {WHISPER_CACHE.stats()}")
+        print(f"ANALYSIS CACHE: {ANALYSIS_CACHE.stats()}")
+        print(f"DALL-E CACHE: {DALLE_CACHE.stats()}")
         print("\n=========================================\n")
-        print(f"JSON OUTPUT: {self.state.json_file_path}")
+
+
+    def _record_task_output(self, task_output: TaskOutput) -> None:
+        """
+        Store a finished task's output in the state and show it right away
+
+        Args:
+            task_output: TaskOutput emitted by the audio crew
+        """
+        if task_output.name not in TASK_RESULTS:
+            print(f"No state field found for task: {task_output.name}")
+            return
+
+        field, label = TASK_RESULTS[task_output.name]
+        setattr(self.state, field, task_output.raw)
+
+        print(f"\n{label}: {task_output.raw}")
         print("\n=========================================\n")
 
 
-    def _get_task_output_by_name(self, tasks_output: List[TaskOutput], task_name):
+    def _dump_state(self) -> str:
+        """
+        Snapshot the state as JSON, including the flow ID
+
+        pydantic-core serializes the state straight to JSON, without
+        building an intermediate dictionary first.
+        """
+        return self.state.model_dump_json(indent=2)
+
+
+    async def _save_state_to_json(self, state_json: str) -> str:
+        """
+        Save a state snapshot to the flow's JSON file
+
+        The state is written as is on a worker thread, which needs no LLM
+        round trip and does not block the event loop. The JsonSavingCrew is
+        only used when reformat_json is set.
+
+        Args:
+            state_json: State data to save, as JSON
+
+        Returns:
+            Path to the saved JSON file
+        """
+        if self.reformat_json:
+            return await self._reformat_state_to_json(state_json)
+
+        return await asyncio.to_thread(self._write_state_json, state_json)
+
+
+    def _write_state_json(self, state_json: str) -> str:
+        """
+        Write a state snapshot to output/<flow id>.json
+
+        Args:
+            state_json: State data to save, as JSON
+
+        Returns:
+            Path to the saved JSON file
+        """
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        json_file_path = os.path.join(OUTPUT_DIR, f"{self.state.id}.json")
+        with open(json_file_path, "w", encoding="utf-8") as f:
+            f.write(state_json)
+
+        return json_file_path
+
+
+    async def _reformat_state_to_json(self, state_json: str) -> str:
         """
-        Helper method to extract output from a specific task by ID
-        
+        Run the JsonSavingCrew on a state snapshot
+
         Args:
-            task_outputs: List of TaskOutput objects
-            task_id: ID of the task to find
-            
+            state_json: State data to save, as JSON
+
         Returns:
-            The output of the task or empty string if not found
-        """
-        for task_output in tasks_output:
-            if hasattr(task_output, 'name') and task_output.name == task_name:
-                return task_output.raw
-                
-        print(f"No task output found with name: {task_name}")
-        return ""
+            Path to the saved JSON file
+        """
+        from echo_synth.crews import JsonSavingCrew
+
+        json_crew = JsonSavingCrew().crew()
+
+        # Run the crew with the state data
+        results = (await json_crew.kickoff_async(
+            inputs={
+                "state_data": state_json,
+                "file_id": self.state.id
+            }
+        )).tasks_output
+
+        # Get the json file path from the results
+        outputs_by_name = {t.name: t.raw for t in results if getattr(t, "name", None)}
+        return outputs_by_name.get("save_to_json", "")
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 import warnings
 import os
+import asyncio
+from typing import List
 from dotenv import load_dotenv
 
 from echo_synth.flows.app_flow import EchoSynthFlow
@@ -11,15 +13,63 @@ load_dotenv()
 # Ignore specific warnings
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
+# Audio formats accepted by Whisper
+AUDIO_EXTENSIONS = (".mp3", ".mp4", ".mpeg", ".mpga", ".m4a", ".wav", ".webm")
+
+
 def run():
-    """Run the EchoSynth flow to process audio and send results"""    
+    """Run the EchoSynth flow to process audio and send results"""
     # Get audio file path from environment or use default
     audio_file_path = os.getenv("AUDIO_FILE_PATH")
-    
+
+    # A directory of recordings is processed as one batch
+    if audio_file_path and os.path.isdir(audio_file_path):
+        audio_file_paths = sorted(
+            os.path.join(audio_file_path, name)
+            for name in os.listdir(audio_file_path)
+            if name.lower().endswith(AUDIO_EXTENSIONS)
+        )
+        concurrency = int(os.getenv("BATCH_CONCURRENCY", 4))
+        if concurrency < 1:
+            raise ValueError(f"BATCH_CONCURRENCY must be at least 1, got {concurrency}")
+        asyncio.run(run_batch(audio_file_paths, concurrency=concurrency))
+        return
+
     # Initialize and run the flow
     echo_flow = EchoSynthFlow(audio_file_path=audio_file_path)
     echo_flow.kickoff()
-    
+
+
+async def run_batch(paths: List[str], concurrency: int = 4) -> list:
+    """
+    Run the EchoSynth flow on several audio files concurrently
+
+    Args:
+        paths: Paths of the audio files to process
+        concurrency: Maximum number of files processed at the same time,
+            which bounds the number of parallel OpenAI calls
+
+    Returns:
+        The output of each flow, or the exception it raised, in input order
+    """
+    if concurrency < 1:
+        raise ValueError(f"Batch concurrency must be at least 1, got {concurrency}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(path: str):
+        async with semaphore:
+            echo_flow = EchoSynthFlow(audio_file_path=path)
+            return await echo_flow.kickoff_async()
+
+    results = await asyncio.gather(*(process(path) for path in paths), return_exceptions=True)
+
+    for path, result in zip(paths, results):
+        if isinstance(result, Exception):
+            print(f"Failed to process {path}: {result}")
+    print(f"Processed {len(paths) - sum(isinstance(r, Exception) for r in results)}/{len(paths)} audio files")
+
+    return results
 
 
 def plot():
@@ -31,4 +81,4 @@ def plot():
 
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
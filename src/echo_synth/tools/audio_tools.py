@@ -1,10 +1,48 @@
 import os
-import requests
+import json
+import mimetypes
+
+from concurrent.futures import ThreadPoolExecutor
 
 from openai import OpenAI
-from typing import Type, Optional
+from typing import Dict, List, Literal, Type, Optional, Union, get_args
 from crewai.tools import BaseTool
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .clients import create_openai_client
+from .cache import SemanticCache, TranscriptionCache
+from .local_whisper import LOCAL_MODEL_SIZE, get_local_model, transcribe_locally
+from .preprocessing import PreprocessMode, load_audio, preprocess_audio
+from .rate_limit import GPT4O_BUCKET, WHISPER_BUCKET
+
+
+# Shared by every transcription (including the ones AudioAnalysisTool runs
+# internally), so the same audio is only sent to Whisper once
+WHISPER_CACHE = TranscriptionCache(
+    os.environ.get("WHISPER_CACHE_DIR", "~/.echo_synth/whisper_cache"),
+    ttl=float(os.environ.get("WHISPER_CACHE_TTL", 7 * 24 * 60 * 60)),
+)
+
+# Near-duplicate analysis prompts of the same type reuse an earlier GPT-4o answer
+ANALYSIS_CACHE = SemanticCache("audio_analysis")
+
+# Preprocessing applied before Whisper when a call does not choose one
+DEFAULT_PREPROCESS = os.environ.get("WHISPER_PREPROCESS", "off")
+if DEFAULT_PREPROCESS not in get_args(PreprocessMode):
+    raise ValueError(
+        f"Invalid WHISPER_PREPROCESS '{DEFAULT_PREPROCESS}'. Choose from {list(get_args(PreprocessMode))}"
+    )
+
+# Where transcriptions run: the OpenAI API or a local faster-whisper model
+WhisperBackend = Literal["openai", "faster-whisper"]
+DEFAULT_BACKEND = os.environ.get("WHISPER_BACKEND", "openai")
+
+# Instruction sent to GPT-4o for each supported analysis type
+ANALYSIS_PROMPTS = {
+    "sentiment": "Analyze the sentiment in this transcribed audio. Identify the overall mood, emotional tone, and any significant emotional shifts.",
+    "speaker_count": "Based on this transcription, estimate how many different speakers were in the conversation. Provide evidence from the text.",
+    "background_noise": "Based on this transcription, identify any mentions or indications of background noises or audio quality issues.",
+}
 
 
 class WhisperTranscriptionInput(BaseModel):
@@ -12,24 +50,40 @@ class WhisperTranscriptionInput(BaseModel):
     audio_file_path: str = Field(..., description="Path to the audio file to transcribe.")
     language: Optional[str] = Field(None, description="Optional language code (e.g., 'en', 'es'). If not provided, language will be auto-detected.")
     prompt: Optional[str] = Field(None, description="Optional prompt to guide the transcription for better accuracy.")
+    preprocess: Optional[PreprocessMode] = Field(None, description="Optional audio cleanup before transcription. 'light' filters rumble, trims leading silence and normalizes loudness; 'aggressive' also removes every silence. Defaults to the WHISPER_PREPROCESS setting.")
 
 class WhisperTranscriptionTool(BaseTool):
     name: str = "whisper_transcription"
     description: str = (
-        "Transcribes audio files to text using OpenAI's Whisper model. "
+        "Transcribes audio files to text using OpenAI's Whisper model (through the API or locally). "
         "Accepts .mp3, .mp4, .mpeg, .mpga, .m4a, .wav, and .webm files. "
         "Maximum file size is 25MB. For best results, use a high-quality audio file."
     )
     args_schema: Type[BaseModel] = WhisperTranscriptionInput
     api_key: str = None
+    backend: WhisperBackend = "openai"
+    _client: Optional[OpenAI] = PrivateAttr(default=None)
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, client: Optional[OpenAI] = None,
+                 backend: Optional[str] = None):
         super().__init__()
-        self.api_key = os.environ.get("OPENAI_API_KEY")
+        self.backend = backend or DEFAULT_BACKEND
+        if self.backend not in get_args(WhisperBackend):
+            raise ValueError(f"Invalid Whisper backend '{self.backend}'. Choose from {list(get_args(WhisperBackend))}")
+        
+        if self.backend == "faster-whisper":
+            # Load the local model up front instead of on the first transcription
+            get_local_model()
+            return
+        
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OpenAI API key is required for WhisperTranscriptionTool")
+        # Share an existing client (and its connection pool) when one is given
+        self._client = client or create_openai_client(self.api_key)
     
-    def _run(self, audio_file_path: str, language: Optional[str] = None, prompt: Optional[str] = None) -> str:
+    def _run(self, audio_file_path: str, language: Optional[str] = None, prompt: Optional[str] = None,
+             preprocess: Optional[str] = None) -> str:
         """
         Transcribe audio using OpenAI's Whisper model.
         
@@ -37,6 +91,7 @@ class WhisperTranscriptionTool(BaseTool):
             audio_file_path: Path to the audio file to transcribe
             language: Optional language code
             prompt: Optional prompt to guide transcription
+            preprocess: Optional preprocessing level ('off', 'light' or 'aggressive')
             
         Returns:
             Transcribed text from the audio file
@@ -44,14 +99,39 @@ class WhisperTranscriptionTool(BaseTool):
         if not os.path.exists(audio_file_path):
             return f"Error: Audio file not found at {audio_file_path}"
         
+        upload_path = audio_file_path
         try:
-            client = OpenAI(api_key=self.api_key)
+            model = self._model_name()
+            preprocess = preprocess or DEFAULT_PREPROCESS
+
+            # Reuse a previous transcription of the same audio and parameters
+            audio_hash = WHISPER_CACHE.hash_audio(audio_file_path)
+            cache_key = WHISPER_CACHE.make_key(audio_hash, language, prompt, model, preprocess)
+            cached_text = WHISPER_CACHE.get(cache_key)
+            if cached_text is not None:
+                return cached_text
+
+            if self.backend == "faster-whisper":
+                # Preprocess straight into memory, the local model takes raw samples
+                audio = load_audio(audio_file_path, preprocess) if preprocess != "off" else None
+                text = transcribe_locally(audio if audio is not None else audio_file_path, language, prompt)
+                self._cache_transcription(audio_hash, cache_key, text)
+                return text
+
+            client = self._client
             
-            with open(audio_file_path, "rb") as audio_file:
+            # Drop silence and noise first so less audio is billed and transcribed
+            upload_path = preprocess_audio(audio_file_path, preprocess)
+            
+            with open(upload_path, "rb") as audio_file:
+                # Name the upload and its content type explicitly; the open
+                # file is streamed in chunks by the multipart encoder
+                mime_type = mimetypes.guess_type(upload_path)[0] or "application/octet-stream"
+                
                 # Set up optional parameters
                 transcription_params = {
-                    "file": audio_file,
-                    "model": "whisper-1"  # Using the latest Whisper model
+                    "file": (os.path.basename(upload_path), audio_file, mime_type),
+                    "model": model
                 }
                 
                 if language:
@@ -61,169 +141,207 @@ class WhisperTranscriptionTool(BaseTool):
                     transcription_params["prompt"] = prompt
                 
                 # Perform transcription
+                WHISPER_BUCKET.acquire()
                 response = client.audio.transcriptions.create(**transcription_params)
                 
-                return response.text
+            self._cache_transcription(audio_hash, cache_key, response.text)
+            return response.text
                 
         except Exception as e:
             return f"Transcription error: {str(e)}"
+        
+        finally:
+            if upload_path != audio_file_path:
+                os.remove(upload_path)
 
+    def get_transcription(self, audio_file_path: str) -> str:
+        """
+        Return the latest transcription of an audio file, whatever its parameters
 
-class DallEImageGenerationInput(BaseModel):
-    """Input schema for DallEImageGenerationTool."""
-    prompt: str = Field(..., description="Detailed description of the image you want to generate.")
-    size: str = Field("1024x1024", description="Image size. Options: '1024x1024', '1792x1024', or '1024x1792'")
-    quality: str = Field("standard", description="Image quality. Options: 'standard' or 'hd'")
-    style: str = Field("vivid", description="Image style. Options: 'vivid' or 'natural'")
-    save_path: Optional[str] = Field(None, description="Optional path to save the generated image.")
+        Used when a transcription of the file is needed but the parameters
+        it was made with are not known (e.g. by AudioAnalysisTool), so a
+        transcription made with any language, prompt or preprocessing is
+        reused instead of uploading the file again.
 
-class DallEImageGenerationTool(BaseTool):
-    name: str = "dalle_image_generation"
-    description: str = (
-        "Generates images based on text descriptions using OpenAI's DALL-E 3 model. "
-        "Provides high-quality, detailed images that match the given prompt. "
-        "Can generate images in different sizes and styles."
-    )
-    args_schema: Type[BaseModel] = DallEImageGenerationInput
-    api_key: str = None
-    
-    def __init__(self, api_key: Optional[str] = None):
-        super().__init__()
-        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("OpenAI API key is required for DallEImageGenerationTool")
-    
-    def _run(self, prompt: str, size: str = "1024x1024", quality: str = "standard", 
-             style: str = "vivid", save_path: Optional[str] = None) -> str:
-        """
-        Generate an image using OpenAI's DALL-E 3 model.
-        
         Args:
-            prompt: Text description of the desired image
-            size: Image dimensions (1024x1024, 1792x1024, or 1024x1792)
-            quality: Image quality (standard or hd)
-            style: Image style (vivid or natural)
-            save_path: Optional path to save the generated image
-            
+            audio_file_path: Path to the audio file
+
         Returns:
-            URL of the generated image or path to saved image file
+            Transcribed text, transcribed with the default parameters if the
+            file was not transcribed before
         """
         try:
-            client = OpenAI(api_key=self.api_key)
-            
-            # Validate parameters
-            valid_sizes = ["1024x1024", "1792x1024", "1024x1792"]
-            if size not in valid_sizes:
-                return f"Error: Invalid size. Choose from {valid_sizes}"
-                
-            valid_qualities = ["standard", "hd"]
-            if quality not in valid_qualities:
-                return f"Error: Invalid quality. Choose from {valid_qualities}"
-                
-            valid_styles = ["vivid", "natural"]
-            if style not in valid_styles:
-                return f"Error: Invalid style. Choose from {valid_styles}"
-            
-            # Generate image
-            response = client.images.generate(
-                model="dall-e-3",
-                prompt=prompt,
-                size=size,
-                quality=quality,
-                style=style,
-                n=1
+            cached_text = WHISPER_CACHE.get(
+                WHISPER_CACHE.make_key(WHISPER_CACHE.hash_audio(audio_file_path), self._model_name())
             )
-            
-            image_url = response.data[0].url
-            
-            # Save the image if a save path is provided
-            if save_path:
-                # Download image
-                image_response = requests.get(image_url)
-                if image_response.status_code == 200:
-                    # Ensure directory exists
-                    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
-                    
-                    # Save image
-                    with open(save_path, "wb") as f:
-                        f.write(image_response.content)
-                    return f"Image generated and saved to {save_path}"
-                else:
-                    return f"Generated image URL: {image_url} (Failed to download and save image)"
-            
-            return f"Generated image URL: {image_url}"
-            
-        except Exception as e:
-            return f"Image generation error: {str(e)}"
+        except OSError:
+            cached_text = None
+        if cached_text is not None:
+            return cached_text
+        return self._run(audio_file_path)
+
+    def _model_name(self) -> str:
+        if self.backend == "faster-whisper":
+            return f"faster-whisper/{LOCAL_MODEL_SIZE}"
+        return "whisper-1"  # Using the latest Whisper model
+
+    def _cache_transcription(self, audio_hash: str, cache_key: str, text: str) -> None:
+        # Stored under its exact parameters, and as the latest transcription
+        # of the audio for get_transcription()
+        WHISPER_CACHE.set(cache_key, text)
+        WHISPER_CACHE.set(WHISPER_CACHE.make_key(audio_hash, self._model_name()), text)
 
 
 class AudioAnalysisInput(BaseModel):
     """Input schema for AudioAnalysisTool."""
     audio_file_path: str = Field(..., description="Path to the audio file to analyze.")
-    analysis_type: str = Field(..., description="Type of analysis to perform. Options: 'sentiment', 'speaker_count', 'background_noise'")
+    analysis_type: Union[str, List[str]] = Field(..., description="Type of analysis to perform, or a list of types to perform them all in one call. Options: 'sentiment', 'speaker_count', 'background_noise'")
+    transcript: Optional[str] = Field(None, description="Optional transcript of the audio file. Pass it when the audio has already been transcribed to skip transcribing it again.")
 
 class AudioAnalysisTool(BaseTool):
     name: str = "audio_analysis"
     description: str = (
         "Analyzes audio files to extract information beyond just transcription. "
-        "Can detect sentiment, count speakers, or analyze background noise levels."
+        "Can detect sentiment, count speakers, or analyze background noise levels. "
+        "Request several analysis types at once and pass an existing transcript when available."
     )
     args_schema: Type[BaseModel] = AudioAnalysisInput
     api_key: str = None
+    _client: Optional[OpenAI] = PrivateAttr(default=None)
+    _whisper: Optional[WhisperTranscriptionTool] = PrivateAttr(default=None)
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None,
+                 whisper_tool: Optional[WhisperTranscriptionTool] = None):
         super().__init__()
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OpenAI API key is required for AudioAnalysisTool")
+        
+        # Share the given transcription tool (and its client and connection
+        # pool) or create one to reuse for every analysis
+        if whisper_tool is not None:
+            self._client = whisper_tool._client or create_openai_client(self.api_key)
+            self._whisper = whisper_tool
+        else:
+            self._client = create_openai_client(self.api_key)
+            self._whisper = WhisperTranscriptionTool(api_key=self.api_key, client=self._client)
     
-    def _run(self, audio_file_path: str, analysis_type: str) -> str:
+    def _run(self, audio_file_path: str, analysis_type: Union[str, List[str]],
+             transcript: Optional[str] = None) -> str:
         """
         Analyze audio beyond transcription using AI.
         
         Args:
             audio_file_path: Path to the audio file to analyze
-            analysis_type: Type of analysis to perform
+            analysis_type: Type of analysis to perform, or a list of types
+            transcript: Optional existing transcript of the audio file
             
         Returns:
-            Analysis results based on the chosen analysis type
+            Analysis results based on the chosen analysis type(s)
         """
-        if not os.path.exists(audio_file_path):
-            return f"Error: Audio file not found at {audio_file_path}"
+        analysis_types = [analysis_type] if isinstance(analysis_type, str) else list(dict.fromkeys(analysis_type))
         
-        # First, transcribe the audio
-        transcription_tool = WhisperTranscriptionTool(api_key=self.api_key)
-        transcription = transcription_tool._run(audio_file_path)
+        invalid_types = [t for t in analysis_types if t not in ANALYSIS_PROMPTS]
+        if invalid_types or not analysis_types:
+            return f"Error: Invalid analysis type {invalid_types}. Supported types: {list(ANALYSIS_PROMPTS)}"
         
-        # Now perform the requested analysis using GPT
-        try:
-            client = OpenAI(api_key=self.api_key)
-            
-            if analysis_type == "sentiment":
-                # Analyze sentiment in the transcribed text
-                prompt = f"Analyze the sentiment in this transcribed audio. Identify the overall mood, emotional tone, and any significant emotional shifts. Transcription: {transcription}"
-                
-            elif analysis_type == "speaker_count":
-                # Estimate number of unique speakers
-                prompt = f"Based on this transcription, estimate how many different speakers were in the conversation. Provide evidence from the text. Transcription: {transcription}"
-                
-            elif analysis_type == "background_noise":
-                # Suggest background noise characteristics
-                prompt = f"Based on this transcription, identify any mentions or indications of background noises or audio quality issues. Transcription: {transcription}"
-                
-            else:
-                return f"Error: Invalid analysis type '{analysis_type}'. Supported types: 'sentiment', 'speaker_count', 'background_noise'"
-            
-            # Get analysis from GPT
-            response = client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are an audio analysis assistant that specializes in extracting insights from transcribed audio."},
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            
-            return response.choices[0].message.content
+        if transcript:
+            transcription = transcript
+        else:
+            if not os.path.exists(audio_file_path):
+                return f"Error: Audio file not found at {audio_file_path}"
             
+            # First, transcribe the audio, reusing the transcriber agent's
+            # transcription whatever parameters it used
+            transcription = self._whisper.get_transcription(audio_file_path)
+        
+        # Now perform the requested analyses using GPT
+        try:
+            return self._analyze_all(analysis_types, transcription)
         except Exception as e:
             return f"Audio analysis error: {str(e)}"
+    
+    def _analyze_all(self, analysis_types: List[str], transcription: str) -> str:
+        """
+        Perform several analyses of a transcription.
+        
+        Every analysis type is looked up in the cache on its own, with the
+        lookups (and their embedding calls) running concurrently. The types
+        that miss all concern the same new transcription, so they are
+        answered together in a single GPT-4o round trip that sends the
+        transcription once.
+        
+        Args:
+            analysis_types: Analysis types to perform
+            transcription: Transcription of the audio file
+            
+        Returns:
+            The analysis, or one "type: result" section per analysis type
+        """
+        prompts = {t: f"{ANALYSIS_PROMPTS[t]} Transcription: {transcription}" for t in analysis_types}
+        
+        # Reuse the answer to a near-identical analysis prompt of each type
+        with ThreadPoolExecutor(max_workers=len(analysis_types)) as executor:
+            lookups = dict(zip(analysis_types, executor.map(self._lookup, analysis_types, prompts.values())))
+        
+        analyses = {t: cached["response"] for t, (_, cached) in lookups.items() if cached}
+        missing_types = [t for t in analysis_types if t not in analyses]
+        
+        if missing_types:
+            analyses.update(self._request_analyses(missing_types, transcription, prompts))
+            for t in missing_types:
+                ANALYSIS_CACHE.add(lookups[t][0], analyses[t], analysis_type=t)
+        
+        if len(analysis_types) == 1:
+            return analyses[analysis_types[0]]
+        return "\n\n".join(f"{t}: {analyses[t]}" for t in analysis_types)
+    
+    def _lookup(self, analysis_type: str, prompt: str) -> tuple:
+        """Embed an analysis prompt and find a cached answer, returning both"""
+        embedding = ANALYSIS_CACHE.embed(self._client, prompt)
+        return embedding, ANALYSIS_CACHE.get(embedding, analysis_type=analysis_type)
+    
+    def _request_analyses(self, analysis_types: List[str], transcription: str,
+                          prompts: Dict[str, str]) -> Dict[str, str]:
+        """Ask GPT-4o for one or several analyses in a single request"""
+        if len(analysis_types) == 1:
+            prompt = prompts[analysis_types[0]]
+        else:
+            # Ask for every analysis in a single round trip
+            instructions = "\n".join(f"- {t}: {ANALYSIS_PROMPTS[t]}" for t in analysis_types)
+            prompt = (
+                "Perform each of the following analyses on this transcribed audio and "
+                f"answer each one in its own field.\n{instructions}\nTranscription: {transcription}"
+            )
+        
+        request_params = {
+            "model": "gpt-4o",
+            "messages": [
+                {"role": "system", "content": "You are an audio analysis assistant that specializes in extracting insights from transcribed audio."},
+                {"role": "user", "content": prompt}
+            ]
+        }
+        
+        if len(analysis_types) > 1:
+            request_params["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "audio_analysis",
+                    "strict": True,
+                    "schema": {
+                        "type": "object",
+                        "properties": {t: {"type": "string"} for t in analysis_types},
+                        "required": analysis_types,
+                        "additionalProperties": False,
+                    },
+                },
+            }
+        
+        # Get analysis from GPT
+        GPT4O_BUCKET.acquire()
+        response = self._client.chat.completions.create(**request_params)
+        
+        analysis = response.choices[0].message.content
+        if len(analysis_types) == 1:
+            return {analysis_types[0]: analysis}
+        return json.loads(analysis)
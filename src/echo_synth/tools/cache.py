@@ -0,0 +1,263 @@
+import os
+import time
+import uuid
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+from .rate_limit import EMBEDDING_BUCKET
+
+
+# Settings shared by every semantic cache
+SEMANTIC_CACHE_DIR = os.environ.get("SEMANTIC_CACHE_DIR", "~/.echo_synth/semantic_cache")
+SEMANTIC_CACHE_DISTANCE = float(os.environ.get("SEMANTIC_CACHE_DISTANCE", 0.08))
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters shared by the caches"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        """Hit/miss counters for observability"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+class TranscriptionCache(CacheStats):
+    """
+    Content-addressed on-disk cache for audio transcriptions.
+
+    Entries are keyed by the SHA-256 of the audio bytes plus the parameters
+    that affect the transcription, so renamed or copied files still hit.
+    Expired entries are swept from the directory as new ones are stored.
+    """
+
+    # Least time between two sweeps of expired entries, in seconds
+    SWEEP_INTERVAL = 60 * 60
+
+    def __init__(self, directory: str, ttl: Optional[float] = None):
+        """
+        Args:
+            directory: Directory holding one file per cached transcription
+            ttl: Optional time-to-live of an entry in seconds
+        """
+        super().__init__()
+        self.directory = os.path.expanduser(directory)
+        self.ttl = ttl
+        self._last_sweep = 0.0
+
+    def hash_audio(self, audio_file_path: str) -> str:
+        """Hex SHA-256 of an audio file's contents"""
+        digest = hashlib.sha256()
+        with open(audio_file_path, "rb") as audio_file:
+            for chunk in iter(lambda: audio_file.read(64 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def make_key(self, audio_hash: str, *params: Optional[str]) -> str:
+        """
+        Build the cache key for an audio file and its transcription parameters
+
+        Args:
+            audio_hash: Hash of the audio file, as returned by hash_audio()
+            params: Parameters the transcription depends on (language, prompt, model...)
+
+        Returns:
+            Hex digest identifying the transcription
+        """
+        digest = hashlib.sha256(audio_hash.encode("ascii"))
+        for param in params:
+            digest.update(b"\0" + (param or "").encode("utf-8"))
+
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached transcription for a key, or None on a miss"""
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                text = None
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+        except OSError:
+            text = None
+
+        self._record(text is not None)
+        return text
+
+    def set(self, key: str, text: str) -> None:
+        """Store a transcription under a key"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Write to a temporary file first so concurrent readers never see
+        # a partially written entry
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+        self._sweep()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _sweep(self) -> None:
+        # Expired entries that are never read again would otherwise stay on
+        # disk forever, so remove them every SWEEP_INTERVAL at most
+        if self.ttl is None:
+            return
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep < self.SWEEP_INTERVAL:
+                return
+            self._last_sweep = now
+
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.name.endswith(".txt") and now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+
+class SemanticCache(CacheStats):
+    """
+    Embedding-similarity cache for prompt driven API calls, backed by chromadb.
+
+    Prompts are embedded with an OpenAI embedding model and matched against
+    earlier prompts by cosine distance, so near-duplicate prompts reuse the
+    earlier response. Parameters that must match exactly (e.g. image size)
+    are stored as metadata and applied as filters before the similarity search.
+    """
+
+    def __init__(self, name: str, directory: str = SEMANTIC_CACHE_DIR,
+                 max_distance: float = SEMANTIC_CACHE_DISTANCE,
+                 embedding_model: str = "text-embedding-3-small"):
+        """
+        Args:
+            name: Name of the chromadb collection holding this cache
+            directory: Directory of the persistent chromadb store
+            max_distance: Largest cosine distance still counted as a hit
+            embedding_model: OpenAI model used to embed prompts
+        """
+        super().__init__()
+        self.name = name
+        self.directory = os.path.expanduser(directory)
+        self.max_distance = max_distance
+        self.embedding_model = embedding_model
+        self._collection = None
+
+    def embed(self, client, text: str) -> Optional[List[float]]:
+        """
+        Embed a prompt for lookups and inserts
+
+        Args:
+            client: OpenAI client used for the embedding call
+            text: Prompt to embed
+
+        Returns:
+            The embedding, or None when it could not be computed (the cache is then skipped)
+        """
+        try:
+            EMBEDDING_BUCKET.acquire()
+            response = client.embeddings.create(model=self.embedding_model, input=text)
+            return response.data[0].embedding
+        except Exception as e:
+            print(f"Semantic cache '{self.name}' embedding error: {e}")
+            return None
+
+    def get(self, embedding: Optional[List[float]], **filters: Any) -> Optional[Dict[str, Any]]:
+        """
+        Find the cached response closest to an embedding
+
+        Args:
+            embedding: Embedding of the prompt, as returned by embed()
+            filters: Metadata values the cached entry must match exactly
+
+        Returns:
+            The entry's metadata plus its "response", or None on a miss
+        """
+        if embedding is None:
+            return None
+
+        hit = None
+        try:
+            result = self._get_collection().query(
+                query_embeddings=[embedding],
+                n_results=1,
+                where=self._where(filters),
+            )
+            if result["ids"][0] and result["distances"][0][0] <= self.max_distance:
+                hit = dict(result["metadatas"][0][0])
+                hit["response"] = result["documents"][0][0]
+        except Exception as e:
+            print(f"Semantic cache '{self.name}' lookup error: {e}")
+
+        self._record(hit is not None)
+        return hit
+
+    def add(self, embedding: Optional[List[float]], response: str, **metadata: Any) -> None:
+        """
+        Store a response under a prompt embedding
+
+        Args:
+            embedding: Embedding of the prompt, as returned by embed()
+            response: Response to return for similar prompts
+            metadata: Filter values and extra data kept with the entry
+        """
+        if embedding is None:
+            return
+
+        metadata["created_at"] = time.time()
+        try:
+            self._get_collection().add(
+                ids=[uuid.uuid4().hex],
+                embeddings=[embedding],
+                documents=[response],
+                metadatas=[metadata],
+            )
+        except Exception as e:
+            print(f"Semantic cache '{self.name}' insert error: {e}")
+
+    def _get_collection(self):
+        # chromadb is only loaded once the cache is actually used
+        with self._lock:
+            if self._collection is None:
+                import chromadb
+
+                client = chromadb.PersistentClient(path=self.directory)
+                self._collection = client.get_or_create_collection(
+                    self.name, metadata={"hnsw:space": "cosine"}
+                )
+            return self._collection
+
+    @staticmethod
+    def _where(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if not filters:
+            return None
+        if len(filters) == 1:
+            return dict(filters)
+        return {"$and": [{key: value} for key, value in filters.items()]}
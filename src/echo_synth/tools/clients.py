@@ -0,0 +1,33 @@
+import os
+import httpx
+
+from openai import DefaultHttpxClient, OpenAI
+
+
+# Retries for rate limited (429) and transient errors. The SDK backs off
+# exponentially and honours the Retry-After header
+MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 5))
+
+
+def create_openai_client(api_key: str) -> OpenAI:
+    """
+    Create the OpenAI client a tool keeps for its whole lifetime.
+
+    The client is backed by a single HTTP/2 connection pool, so repeated
+    calls reuse keep-alive connections to the API instead of reconnecting.
+    Rate limited requests are retried with backoff up to MAX_RETRIES times.
+
+    Args:
+        api_key: OpenAI API key
+
+    Returns:
+        OpenAI client
+    """
+    return OpenAI(
+        api_key=api_key,
+        max_retries=MAX_RETRIES,
+        http_client=DefaultHttpxClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=10),
+        ),
+    )
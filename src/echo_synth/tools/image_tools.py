@@ -1,18 +1,44 @@
 import os
-import requests
+import time
+import base64
+import shutil
+import hashlib
+import threading
 
+from functools import lru_cache
 from openai import OpenAI
-from typing import Type, Optional
+from typing import Literal, Type, Optional
 from crewai.tools import BaseTool
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .clients import create_openai_client
+from .cache import SemanticCache
+from .rate_limit import DALLE_BUCKET
+
+
+# Near-duplicate prompts with the same size/quality/style reuse an earlier image
+DALLE_CACHE = SemanticCache("dalle_images")
+
+# Copies of the saved images owned by the cache, named by content hash, so
+# a hit never depends on a save path the caller may have overwritten since
+DALLE_IMAGE_DIR = os.path.join(DALLE_CACHE.directory, "dalle_images")
+
+# DALL-E image URLs expire after an hour, keep a safety margin
+DALLE_URL_TTL = 55 * 60
+
+
+@lru_cache(maxsize=128)
+def _ensure_dir(directory: str) -> None:
+    """Create a save directory the first time it is used in this process"""
+    os.makedirs(directory, exist_ok=True)
 
 
 class DallEImageGenerationInput(BaseModel):
     """Input schema for DallEImageGenerationTool."""
     prompt: str = Field(..., description="Detailed description of the image you want to generate.")
-    size: str = Field("1024x1024", description="Image size. Options: '1024x1024', '1792x1024', or '1024x1792'")
-    quality: str = Field("standard", description="Image quality. Options: 'standard' or 'hd'")
-    style: str = Field("vivid", description="Image style. Options: 'vivid' or 'natural'")
+    size: Literal["1024x1024", "1792x1024", "1024x1792"] = Field("1024x1024", description="Image size. Options: '1024x1024', '1792x1024', or '1024x1792'")
+    quality: Literal["standard", "hd"] = Field("standard", description="Image quality. Options: 'standard' or 'hd'")
+    style: Literal["vivid", "natural"] = Field("vivid", description="Image style. Options: 'vivid' or 'natural'")
     save_path: Optional[str] = Field(None, description="Optional path to save the generated image.")
 
 class DallEImageGenerationTool(BaseTool):
@@ -24,15 +50,18 @@ class DallEImageGenerationTool(BaseTool):
     )
     args_schema: Type[BaseModel] = DallEImageGenerationInput
     api_key: str = None
+    _client: Optional[OpenAI] = PrivateAttr(default=None)
     
     def __init__(self, api_key: Optional[str] = None):
         super().__init__()
         self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OpenAI API key is required for DallEImageGenerationTool")
+        self._client = create_openai_client(self.api_key)
     
-    def _run(self, prompt: str, size: str = "1024x1024", quality: str = "standard", 
-             style: str = "vivid", save_path: Optional[str] = None) -> str:
+    def _run(self, prompt: str, size: Literal["1024x1024", "1792x1024", "1024x1792"] = "1024x1024",
+             quality: Literal["standard", "hd"] = "standard", style: Literal["vivid", "natural"] = "vivid",
+             save_path: Optional[str] = None) -> str:
         """
         Generate an image using OpenAI's DALL-E 3 model.
         
@@ -47,50 +76,108 @@ class DallEImageGenerationTool(BaseTool):
             URL of the generated image or path to saved image file
         """
         try:
-            client = OpenAI(api_key=self.api_key)
+            client = self._client
             
-            # Validate parameters
-            valid_sizes = ["1024x1024", "1792x1024", "1024x1792"]
-            if size not in valid_sizes:
-                return f"Error: Invalid size. Choose from {valid_sizes}"
-                
-            valid_qualities = ["standard", "hd"]
-            if quality not in valid_qualities:
-                return f"Error: Invalid quality. Choose from {valid_qualities}"
-                
-            valid_styles = ["vivid", "natural"]
-            if style not in valid_styles:
-                return f"Error: Invalid style. Choose from {valid_styles}"
+            # size, quality and style are validated by DallEImageGenerationInput
             
-            # Generate image
+            # Reuse an image generated for a near-identical prompt
+            image_params = {"size": size, "quality": quality, "style": style}
+            embedding = DALLE_CACHE.embed(client, prompt)
+            cached = DALLE_CACHE.get(embedding, **image_params)
+            if cached:
+                cached_result = self._reuse_cached_image(cached, save_path)
+                if cached_result:
+                    return cached_result
+            
+            # Generate image. When it is saved, ask for the image bytes inline
+            # instead of a URL that would have to be downloaded separately
+            DALLE_BUCKET.acquire()
             response = client.images.generate(
                 model="dall-e-3",
                 prompt=prompt,
                 size=size,
                 quality=quality,
                 style=style,
+                response_format="b64_json" if save_path else "url",
                 n=1
             )
             
-            image_url = response.data[0].url
-            
             # Save the image if a save path is provided
             if save_path:
-                # Download image
-                image_response = requests.get(image_url)
-                if image_response.status_code == 200:
-                    # Ensure directory exists
-                    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
-                    
-                    # Save image
-                    with open(save_path, "wb") as f:
-                        f.write(image_response.content)
-                    return f"Image generated and saved to {save_path}"
-                else:
-                    return f"Generated image URL: {image_url} (Failed to download and save image)"
+                saved_path = os.path.abspath(save_path)
+                
+                # Ensure directory exists
+                _ensure_dir(os.path.dirname(saved_path))
+                
+                # Save image
+                image_bytes = base64.b64decode(response.data[0].b64_json)
+                with open(saved_path, "wb") as f:
+                    f.write(image_bytes)
+                
+                if embedding is not None:
+                    cached_image = self._store_cached_image(image_bytes)
+                    DALLE_CACHE.add(embedding, cached_image, cached_image=cached_image, **image_params)
+                return f"Image generated and saved to {save_path}"
             
+            image_url = response.data[0].url
+            DALLE_CACHE.add(embedding, image_url, cached_image="", **image_params)
             return f"Generated image URL: {image_url}"
             
         except Exception as e:
             return f"Image generation error: {str(e)}"
 
+    def _reuse_cached_image(self, cached: dict, save_path: Optional[str] = None) -> Optional[str]:
+        """
+        Build the tool result from a semantic cache hit
+        
+        Args:
+            cached: Cache entry holding either the image URL, or the cache's
+                own copy of the image (saved images are returned inline, not
+                as a URL)
+            save_path: Optional path to save the image
+            
+        Returns:
+            Result message, or None if the cached image can no longer be used
+        """
+        cached_image = cached.get("cached_image")
+        has_cached_image = bool(cached_image) and os.path.exists(cached_image)
+        
+        if save_path:
+            if not has_cached_image:
+                return None
+            target_path = os.path.abspath(save_path)
+            _ensure_dir(os.path.dirname(target_path))
+            shutil.copyfile(cached_image, target_path)
+            return f"Image generated and saved to {save_path}"
+        
+        if has_cached_image:
+            return f"Image generated and saved to {cached_image}"
+        
+        # Entries written before the cache kept its own copies point at the
+        # caller's save path instead (saved_path), which is never trusted
+        is_url_entry = not cached_image and not cached.get("saved_path")
+        if is_url_entry and time.time() - cached["created_at"] < DALLE_URL_TTL:
+            return f"Generated image URL: {cached['response']}"
+        return None
+    
+    def _store_cached_image(self, image_bytes: bytes) -> str:
+        """
+        Keep the cache's own copy of a generated image
+        
+        Args:
+            image_bytes: PNG bytes of the image
+            
+        Returns:
+            Path of the copy, named by the SHA-256 of its contents
+        """
+        _ensure_dir(DALLE_IMAGE_DIR)
+        cached_image = os.path.join(DALLE_IMAGE_DIR, f"{hashlib.sha256(image_bytes).hexdigest()}.png")
+        if not os.path.exists(cached_image):
+            # Write to a temporary file first so a concurrent hit never
+            # copies a partially written image
+            tmp_path = f"{cached_image}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(image_bytes)
+            os.replace(tmp_path, cached_image)
+        return cached_image
+
@@ -0,0 +1,72 @@
+import os
+import threading
+from typing import Optional
+
+
+# Local faster-whisper settings
+LOCAL_MODEL_SIZE = os.environ.get("WHISPER_LOCAL_MODEL", "large-v3")
+LOCAL_DEVICE = os.environ.get("WHISPER_DEVICE", "auto")
+LOCAL_COMPUTE_TYPE = os.environ.get("WHISPER_COMPUTE_TYPE")
+LOCAL_BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE", 16))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_local_model():
+    """
+    Load the faster-whisper model once per process.
+
+    Uses int8 weights (int8_float16 on CUDA) unless WHISPER_COMPUTE_TYPE says
+    otherwise, which gives most of the throughput for a small accuracy cost.
+
+    Returns:
+        faster_whisper.WhisperModel shared by every local transcription
+    """
+    global _model
+    with _model_lock:
+        if _model is None:
+            try:
+                import ctranslate2
+                from faster_whisper import WhisperModel
+            except ImportError as e:
+                raise ImportError(
+                    "The faster-whisper backend requires the 'local' extra: pip install 'echo_synth[local]'"
+                ) from e
+
+            device = LOCAL_DEVICE
+            if device == "auto":
+                device = "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+            compute_type = LOCAL_COMPUTE_TYPE or ("int8_float16" if device == "cuda" else "int8")
+
+            _model = WhisperModel(LOCAL_MODEL_SIZE, device=device, compute_type=compute_type)
+        return _model
+
+
+def transcribe_locally(audio, language: Optional[str] = None, prompt: Optional[str] = None) -> str:
+    """
+    Transcribe audio with the local faster-whisper model.
+
+    The audio is split into 30 second chunks that are decoded in batches,
+    with faster-whisper's built-in VAD skipping silent chunks.
+
+    Args:
+        audio: Path to the audio file, or 16 kHz mono float32 samples
+        language: Optional language code
+        prompt: Optional prompt to guide transcription
+
+    Returns:
+        Transcribed text
+    """
+    from faster_whisper import BatchedInferencePipeline
+
+    # The pipeline keeps per-transcription state, so each call gets its own
+    # around the shared model
+    pipeline = BatchedInferencePipeline(get_local_model())
+    segments, _ = pipeline.transcribe(
+        audio,
+        language=language,
+        initial_prompt=prompt,
+        batch_size=LOCAL_BATCH_SIZE,
+    )
+    return " ".join(segment.text.strip() for segment in segments)
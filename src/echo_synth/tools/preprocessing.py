@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import subprocess
+from typing import List, Literal, Optional
+
+
+# Sample rate Whisper models work at
+SAMPLE_RATE = 16000
+
+# Preprocessing levels a transcription can ask for
+PreprocessMode = Literal["off", "light", "aggressive"]
+
+# ffmpeg filter chains for each preprocessing level:
+# - light: 80 Hz high-pass, trim leading silence, loudness normalization
+# - aggressive: same, but also cut every silence longer than half a second
+PREPROCESS_FILTERS = {
+    "light": (
+        "highpass=f=80,"
+        "silenceremove=start_periods=1:start_silence=0.5:start_threshold=-40dB,"
+        "loudnorm"
+    ),
+    "aggressive": (
+        "highpass=f=80,"
+        "silenceremove=start_periods=1:start_silence=0.5:start_threshold=-40dB"
+        ":stop_periods=-1:stop_duration=0.5:stop_threshold=-40dB,"
+        "loudnorm"
+    ),
+}
+
+
+def preprocess_audio(audio_file_path: str, mode: str = "light") -> str:
+    """
+    Clean up an audio file with ffmpeg before sending it to Whisper.
+
+    Silence is billed by the minute and slows transcription down, so
+    dropping it cuts both cost and latency. The result is written as
+    16 kHz mono FLAC, which is the sample rate Whisper works at, and keeps
+    uploads small.
+
+    Args:
+        audio_file_path: Path to the audio file to preprocess
+        mode: Preprocessing level, 'off', 'light' or 'aggressive'
+
+    Returns:
+        Path to the preprocessed temporary file (the caller removes it), or
+        the original path when preprocessing is off or could not be done
+    """
+    if mode == "off":
+        return audio_file_path
+
+    fd, output_path = tempfile.mkstemp(prefix="echo_synth_", suffix=".flac")
+    os.close(fd)
+
+    if _run_ffmpeg(audio_file_path, mode, [output_path]) is None:
+        os.remove(output_path)
+        return audio_file_path
+
+    return output_path
+
+
+def load_audio(audio_file_path: str, mode: str = "light"):
+    """
+    Preprocess an audio file with ffmpeg straight into memory.
+
+    Used by local transcription, which accepts the samples directly, so no
+    temporary file is needed.
+
+    Args:
+        audio_file_path: Path to the audio file to preprocess
+        mode: Preprocessing level, 'off', 'light' or 'aggressive'
+
+    Returns:
+        16 kHz mono float32 numpy array, or None when ffmpeg is unavailable
+        or failed (the caller should then use the original file)
+    """
+    output = _run_ffmpeg(audio_file_path, mode, ["-f", "f32le", "-"])
+    if output is None:
+        return None
+
+    import numpy as np
+
+    return np.frombuffer(output, dtype=np.float32)
+
+
+def _run_ffmpeg(audio_file_path: str, mode: str, output_args: List[str]) -> Optional[bytes]:
+    """Run the ffmpeg cleanup for a level, returning stdout or None on failure"""
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        print("ffmpeg not found, transcribing the audio without preprocessing")
+        return None
+
+    filters = ["-af", PREPROCESS_FILTERS[mode]] if mode in PREPROCESS_FILTERS else []
+
+    try:
+        result = subprocess.run(
+            [
+                ffmpeg, "-y", "-hide_banner", "-loglevel", "error",
+                "-i", audio_file_path,
+                *filters,
+                "-ac", "1", "-ar", str(SAMPLE_RATE),
+                *output_args,
+            ],
+            check=True,
+            capture_output=True,
+        )
+    except subprocess.CalledProcessError as e:
+        print(f"Audio preprocessing failed, using the original file: {e.stderr.decode(errors='replace').strip()}")
+        return None
+
+    return result.stdout
@@ -0,0 +1,57 @@
+import os
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting how often an OpenAI API is called.
+
+    Tools run on the crew's worker threads (several crews at once in batch
+    runs), so one bucket per API is shared by all of them. The bucket holds
+    up to a minute's worth of requests and refills continuously.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        """
+        Args:
+            requests_per_minute: Allowed request rate, 0 disables the limit
+        """
+        self.requests_per_minute = requests_per_minute
+        self._rate = requests_per_minute / 60
+        self._tokens = float(requests_per_minute)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> None:
+        """
+        Block until the given number of requests may be sent
+
+        Args:
+            tokens: Number of requests about to be sent
+        """
+        if self._rate <= 0:
+            return
+
+        # A request larger than the bucket would never fit, let it through
+        # once the bucket is full
+        tokens = min(tokens, self.requests_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.requests_per_minute, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self._rate
+
+            time.sleep(wait)
+
+
+# One bucket per rate limited API, shared by every tool in the process
+WHISPER_BUCKET = TokenBucket(float(os.environ.get("WHISPER_RPM", 0)))
+DALLE_BUCKET = TokenBucket(float(os.environ.get("DALLE_RPM", 0)))
+GPT4O_BUCKET = TokenBucket(float(os.environ.get("GPT4O_RPM", 0)))
+EMBEDDING_BUCKET = TokenBucket(float(os.environ.get("EMBEDDING_RPM", 0)))